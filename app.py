@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
@@ -7,7 +7,19 @@ import os
 from pathlib import Path
 import fcntl
 import time
-from threading import Lock
+import hashlib
+import pickle
+import json
+import uuid
+import csv
+import io
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock, BoundedSemaphore
+import rendering
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -25,9 +37,31 @@ CORS(app, resources={
 file_lock = Lock()
 
 # File paths
-MASTER_FILE = 'tracker_master_data.xlsx'
+MASTER_FILE = 'tracker_master_data.xlsx'  # Legacy single-sheet store, split into partitions on first run
 GENERATED_FILE = 'tracker_generated_report.xlsx'
 USERS_FILE = 'users_master_data.xlsx'
+PARTITION_DIR = 'tracker_partitions'
+MANIFEST_FILE = os.path.join(PARTITION_DIR, 'manifest.json')
+STORAGE_LOCK_FILE = os.path.join(PARTITION_DIR, '.lock')
+SNAPSHOT_DIR = os.path.join(PARTITION_DIR, 'snapshots')
+GENERATION_FILE = os.path.join(PARTITION_DIR, 'generation')
+HISTORY_DIR = os.path.join(PARTITION_DIR, 'history')
+HISTORY_LOG = os.path.join(HISTORY_DIR, 'changes.jsonl')
+HISTORY_STATE_FILE = os.path.join(HISTORY_DIR, 'state.json')
+
+# Tracker rows are partitioned by Date of Shipment: 'year' or 'month'.
+# Only used when the store is first created; afterwards the manifest decides.
+PARTITION_GRANULARITY = os.environ.get('TRACKER_PARTITION_GRANULARITY', 'year')
+UNDATED_PARTITION = 'undated'
+
+# Times a reader starts over on the latest manifest when a file it pinned is gone
+CONSISTENT_READ_ATTEMPTS = 5
+
+# Seconds a replaced partition file is kept so reads pinned to an older manifest can finish
+RETIRED_FILE_GRACE = int(os.environ.get('TRACKER_RETIRED_FILE_GRACE', '300'))
+
+# Bump when the snapshot layout changes so stale snapshots are ignored
+SNAPSHOT_VERSION = 1
 
 # Field mapping for better readability
 FIELD_LABELS = {
@@ -56,10 +90,54 @@ FIELD_LABELS = {
 
 ALL_FIELDS = list(FIELD_LABELS.keys())
 
+# Reverse lookup used when parsing workbook headers
+LABEL_TO_FIELD = {label: key for key, label in FIELD_LABELS.items()}
+
+# Fields that identify the same shipment when importing
+DEDUP_FIELDS = ('jiraId', 'salesforceId', 'saveFileName')
+
+# Rows per partition file. Larger partitions are split over several files,
+# so a write only rewrites the files whose rows changed.
+SEGMENT_ROWS = int(os.environ.get('TRACKER_SEGMENT_ROWS', '5000'))
+
+# Imported rows buffered per partition before they are committed as new files,
+# and across all partitions before the largest buffer is committed early
+IMPORT_BATCH_SIZE = int(os.environ.get('TRACKER_IMPORT_BATCH_SIZE', '5000'))
+IMPORT_BUFFER_ROWS = 4 * IMPORT_BATCH_SIZE
+
+# Maximum number of row errors listed in an import report
+IMPORT_MAX_ERRORS = 100
+
+# Fields /generate-selected can split its output by, one workbook per value
+RENDER_GROUP_FIELDS = ('customer', 'vendorName')
+
+# Processes for rendering grouped delivery sheets, for the whole server. They
+# are shared out between its worker processes (WEB_CONCURRENCY, which gunicorn
+# and uvicorn both read), so workers x pool size never exceeds it.
+RENDER_PROCESSES = int(os.environ.get('RENDER_PROCESSES', os.cpu_count() or 1))
+RENDER_PROCESSES_PER_WORKER = max(1, RENDER_PROCESSES // int(os.environ.get('WEB_CONCURRENCY', '1')))
+
+# A full checkpoint of the change history is written once the changes logged
+# since the last one outgrow this fraction of its size (and at least the minimum)
+HISTORY_CHECKPOINT_RATIO = float(os.environ.get('TRACKER_HISTORY_CHECKPOINT_RATIO', '1.0'))
+HISTORY_CHECKPOINT_MIN_BYTES = int(os.environ.get('TRACKER_HISTORY_CHECKPOINT_MIN_BYTES', str(1024 * 1024)))
+
+# Fields left out of the change history (IDs are renumbered on every read)
+HISTORY_IGNORED_FIELDS = ('id', 'originalId')
+
+# Parsed partition contents keyed by (path, sheet); partition files are never modified in place
+_sheet_cache = {}
+_manifest_cache = {}
+_partitions_initialized = False
+_snapshot_pending = set()  # Cache keys parsed or written since the last save_snapshot()
+_history_index = {'offset': 0, 'lines': {}}  # Byte offsets of each record's change log lines
+_history_index_lock = Lock()
+_render_pool = None
+_render_pool_lock = Lock()
+
 
-def acquire_file_lock(file_handle):
+def acquire_file_lock(file_handle, max_retries=10):
     """Acquire an exclusive lock on a file"""
-    max_retries = 10
     retry_count = 0
     while retry_count < max_retries:
         try:
@@ -105,101 +183,649 @@ def initialize_users_file():
         wb.close()
 
 
-def initialize_master_file():
-    """Initialize the master Excel file if it doesn't exist"""
-    if not os.path.exists(MASTER_FILE):
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = 'Tracker Data'
-        
-        # Add headers with styling
-        headers = ['ID'] + [FIELD_LABELS[field] for field in ALL_FIELDS[1:]]
-        ws.append(headers)
-        
-        # Style the header row
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_font = Font(name='Calibri', size=12, bold=True, color='FFFFFF')
-        
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Set column widths
-        column_widths = {
-            'A': 8, 'B': 20, 'C': 15, 'D': 20, 'E': 20, 'F': 15, 'G': 15,
-            'H': 30, 'I': 20, 'J': 15, 'K': 30, 'L': 15, 'M': 15, 'N': 30,
-            'O': 15, 'P': 15, 'Q': 25, 'R': 30
-        }
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
-        
-        wb.save(MASTER_FILE)
+def create_tracker_workbook(title='Tracker Data'):
+    """Create an empty tracker workbook with styled headers"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = title
+    write_tracker_headers(ws)
+    return wb
 
 
-def get_next_id():
-    """Get the next available ID"""
-    wb = openpyxl.load_workbook(MASTER_FILE)
-    ws = wb.active
+def write_tracker_headers(ws):
+    """Add the styled header row and column widths to a tracker sheet"""
+    # Add headers with styling
+    headers = ['ID'] + [FIELD_LABELS[field] for field in ALL_FIELDS[1:]]
+    ws.append(headers)
     
-    max_id = 0
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if row[0] is not None:
-            try:
-                current_id = int(row[0])
-                max_id = max(max_id, current_id)
-            except (ValueError, TypeError):
-                pass
+    # Style the header row
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_font = Font(name='Calibri', size=12, bold=True, color='FFFFFF')
     
-    wb.close()
-    return max_id + 1
+    for cell in ws[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+    
+    # Set column widths
+    column_widths = {
+        'A': 8, 'B': 20, 'C': 15, 'D': 20, 'E': 20, 'F': 15, 'G': 15,
+        'H': 30, 'I': 20, 'J': 15, 'K': 30, 'L': 15, 'M': 15, 'N': 30,
+        'O': 15, 'P': 15, 'Q': 25, 'R': 30
+    }
+    for col, width in column_widths.items():
+        ws.column_dimensions[col].width = width
 
 
-def read_all_data():
-    """Read all data from master file and renumber IDs sequentially"""
-    initialize_master_file()
-    
-    # Use thread lock for read
+class StorageBusyError(Exception):
+    """Raised when the partition store stays locked by another writer"""
+
+
+@contextmanager
+def storage_lock(max_retries=10):
+    """Hold the thread lock and an exclusive file lock on the partition store"""
     with file_lock:
-        lock_file = open(MASTER_FILE, 'r')
-        if not acquire_file_lock(lock_file):
+        lock_file = open(STORAGE_LOCK_FILE, 'a')
+        if not acquire_file_lock(lock_file, max_retries):
             lock_file.close()
-            raise Exception("Could not acquire file lock. Please try again.")
+            raise StorageBusyError("Could not acquire file lock. Please try again.")
         
         try:
-            wb = openpyxl.load_workbook(MASTER_FILE)
-            ws = wb.active
-            
-            data = []
-            headers = [cell.value for cell in ws[1]]
-            
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if row[0] is not None:  # Check if ID exists
-                    record = {}
-                    for i, header in enumerate(headers):
-                        # Convert header back to field key
-                        field_key = None
-                        for key, label in FIELD_LABELS.items():
-                            if label == header:
-                                field_key = key
-                                break
-                        
-                        if field_key:
-                            value = row[i] if i < len(row) else None
-                            # Convert date objects to string
-                            if isinstance(value, datetime):
-                                value = value.strftime('%Y-%m-%d')
-                            record[field_key] = value
-                    
-                    data.append(record)
-            
-            wb.close()
+            yield
         finally:
             release_file_lock(lock_file)
             lock_file.close()
+
+
+# ============ PARSED DATA CACHE AND SNAPSHOT ============
+
+def file_signature(path):
+    """Return a cheap (mtime, size) signature used to detect file changes"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def file_checksum(path):
+    """Return the SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_cell_value(value):
+    """Convert a cell value to the form read_all_data() returns"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if value == '':
+        # openpyxl stores empty strings as blank cells
+        return None
+    return value
+
+
+def dedup_key(record):
+    """Return the normalized (jiraId, salesforceId, saveFileName) key, or None if all are blank"""
+    key = tuple(str(record.get(field) or '').strip().upper() for field in DEDUP_FIELDS)
+    return key if any(key) else None
+
+
+def build_record_index(records):
+    """Build lookup structures over the stored (un-renumbered) records"""
+    dedup = set()
+    original_ids = set()
+    max_id = 0
+    for record in records:
+        key = dedup_key(record)
+        if key:
+            dedup.add(key)
+        if record.get('originalId') not in (None, ''):
+            original_ids.add(str(record['originalId']))
+        try:
+            # Original IDs count too, so new entries never reuse one
+            max_id = max(max_id, int(record.get('originalId') or 0))
+        except (ValueError, TypeError):
+            pass
+        try:
+            max_id = max(max_id, int(record.get('id')))
+        except (ValueError, TypeError):
+            pass
+    return {'dedup': dedup, 'original_ids': original_ids, 'max_id': max_id}
+
+
+def parse_workbook_records(path, sheet=None):
+    """Parse all tracker records from a workbook (or one named sheet of it)"""
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.active
+        rows = ws.iter_rows(values_only=True)
+        headers = next(rows, ())
+        columns = [(i, LABEL_TO_FIELD[header]) for i, header in enumerate(headers)
+                   if header in LABEL_TO_FIELD]
+        
+        records = []
+        for row in rows:
+            if row and row[0] is not None:  # Check if ID exists
+                record = {}
+                for i, field_key in columns:
+                    value = row[i] if i < len(row) else None
+                    record[field_key] = normalize_cell_value(value)
+                records.append(record)
+    finally:
+        wb.close()
+    return records
+
+
+def cache_records(path, sheet, records, checksum=None):
+    """Store the parsed records of a partition file in the in-memory cache"""
+    entry = {
+        'path': path,
+        'sheet': sheet,
+        'signature': file_signature(path),
+        'checksum': checksum or file_checksum(path),
+        'records': records,
+        'index': build_record_index(records)
+    }
+    _sheet_cache[(path, sheet)] = entry
+    _snapshot_pending.add((path, sheet))
+    return entry
+
+
+def load_file_records(path, sheet=None):
+    """Return the cache entry for one partition file, parsing it on first use"""
+    entry = _sheet_cache.get((path, sheet))
+    if entry is None:
+        # A file name is never reused for new contents, so a cached entry is always current
+        entry = cache_records(path, sheet, parse_workbook_records(path, sheet))
+    return entry
+
+
+def load_partition_entries(partition):
+    """Return the cache entries for each of a partition's files, in row order"""
+    return [load_file_records(path, sheet) for path, sheet in partition_sources(partition)]
+
+
+def load_partition_records(partition):
+    """Return all stored records of a partition, in row order"""
+    entries = load_partition_entries(partition)
+    if len(entries) == 1:
+        return entries[0]['records']
+    return [record for entry in entries for record in entry['records']]
+
+
+def prune_cache(manifest):
+    """Drop cache entries for files the manifest no longer references"""
+    sources = {source for partition in manifest['partitions'] for source in partition_sources(partition)}
+    for key in list(_sheet_cache):
+        if key not in sources:
+            _sheet_cache.pop(key, None)
+
+
+def snapshot_path(path, sheet=None):
+    """Return the snapshot file for one partition file (or one sheet of the archive)"""
+    name = os.path.basename(path)
+    return os.path.join(SNAPSHOT_DIR, f'{name}.{sheet}.snapshot' if sheet else f'{name}.snapshot')
+
+
+def remove_snapshots(file_name):
+    """Delete the snapshots of a partition file that is being removed"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.startswith(f'{file_name}.'):
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+def save_snapshot():
+    """Write a binary snapshot of each partition file parsed or written since the last save.
+
+    Partition files are never modified in place, so each snapshot is written
+    once and a write only pickles the files it created.
+    """
+    while _snapshot_pending:
+        try:
+            key = _snapshot_pending.pop()
+        except KeyError:
+            break  # Another thread took the last one
+        entry = _sheet_cache.get(key)
+        if entry is None:
+            continue  # Dropped from the cache since it was parsed
+        
+        snapshot = {'version': SNAPSHOT_VERSION, 'fields': ALL_FIELDS, 'entry': entry}
+        path = snapshot_path(*key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # The snapshot is only an accelerator; the workbooks stay authoritative
+            print(f"Warning: could not write snapshot: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def load_snapshot():
+    """Populate the cache from the snapshots, keeping only entries that still match their workbook"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return False
+    
+    checksums = {}
+    loaded = False
+    for name in os.listdir(SNAPSHOT_DIR):
+        if not name.endswith('.snapshot'):
+            continue
+        try:
+            with open(os.path.join(SNAPSHOT_DIR, name), 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"Warning: ignoring unreadable snapshot {name}: {e}")
+            continue
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('fields') != ALL_FIELDS:
+            continue
+        
+        entry = snapshot['entry']
+        path = entry['path']
+        if not os.path.exists(path):
+            # Partition files are never recreated, so this snapshot is of no further use
+            remove_snapshots(os.path.basename(path))
+            continue
+        signature = file_signature(path)
+        if entry['signature'] != signature:
+            # mtime changes on copy/deploy, so fall back to comparing contents
+            if path not in checksums:
+                checksums[path] = file_checksum(path)
+            if entry['checksum'] != checksums[path]:
+                continue
+            entry['signature'] = signature
+        _sheet_cache[(path, entry['sheet'])] = entry
+        loaded = True
+    return loaded
+
+
+def warm_cache():
+    """Load parsed data at startup, from the snapshots when they are still valid"""
+    initialize_partitions()
+    load_snapshot()
+    
+    def load_all(manifest):
+        for partition in manifest['partitions']:
+            load_partition_entries(partition)
+    
+    read_consistent(load_all)
+    save_snapshot()
+
+
+# ============ CROSS-WORKER COHERENCE ============
+# Partition files are never modified in place. A write saves new files and
+# then atomically replaces the manifest to point at them, which is its
+# commit. A reader pins the manifest it started with and reads only the
+# files it names, so it never waits for a writer; replaced files are kept
+# for RETIRED_FILE_GRACE seconds so pinned reads can finish. Every commit
+# also bumps a generation counter kept in GENERATION_FILE, so a worker can
+# tell whether its cached manifest is current with a single small read.
+
+def read_generation():
+    """Return the store's generation counter (0 before the first write)"""
+    try:
+        with open(GENERATION_FILE, 'r') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_generation(generation):
+    """Atomically publish a new generation; caller holds storage_lock()"""
+    tmp_path = f'{GENERATION_FILE}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(str(generation))
+    os.replace(tmp_path, GENERATION_FILE)
+
+
+@contextmanager
+def store_transaction():
+    """Hold the storage lock for a write and publish a new generation when it ends"""
+    with storage_lock():
+        try:
+            yield
+        finally:
+            # Bumped after the manifest swap, so a worker that sees the new
+            # generation also sees the new manifest
+            write_generation(read_generation() + 1)
+
+
+def read_consistent(reader):
+    """Run reader(manifest) against the last committed manifest, without waiting for writers"""
+    for attempt in range(CONSISTENT_READ_ATTEMPTS):
+        try:
+            return reader(current_manifest(refresh=attempt > 0))
+        except FileNotFoundError:
+            # The read outlived the grace period of a file its manifest named
+            continue
+    raise StorageBusyError("The data is changing too quickly to read. Please try again.")
+
+
+def current_manifest(refresh=False):
+    """Return the last committed manifest, re-reading it only when the generation moved"""
+    generation = read_generation()
+    cached = _manifest_cache.get('current')
+    if refresh or cached is None or cached[0] != generation:
+        # Stored as one tuple so concurrent threads never pair a manifest with the wrong generation
+        cached = (generation, read_manifest())
+        _manifest_cache['current'] = cached
+        prune_cache(cached[1])
+    return cached[1]
+
+
+# ============ PARTITIONED STORAGE ============
+
+class ArchivedPartitionError(Exception):
+    """Raised when a write targets a partition that has been rolled into the archive"""
+
+
+class RecordNotFoundError(Exception):
+    """Raised when a write addresses an entry that is not stored"""
+
+
+class RecordConflictError(Exception):
+    """Raised when an entry was changed by someone else since the client loaded it"""
+    
+    def __init__(self, record):
+        super().__init__('This record was modified by another user. Please refresh and try again.')
+        self.record = record
+
+
+def partition_key(date_value, granularity):
+    """Return the partition key ('YYYY' or 'YYYY-MM') for a date of shipment"""
+    if isinstance(date_value, datetime):
+        date_value = date_value.strftime('%Y-%m-%d')
+    try:
+        shipped = datetime.strptime(str(date_value)[:10], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return UNDATED_PARTITION
+    return shipped.strftime('%Y') if granularity == 'year' else shipped.strftime('%Y-%m')
+
+
+def partition_bounds(key, granularity):
+    """Return the first and last 'YYYY-MM-DD' a dated partition can hold"""
+    if granularity == 'year':
+        return f'{key}-01-01', f'{key}-12-31'
+    return f'{key}-01', f'{key}-31'
+
+
+def partition_overlaps(key, granularity, date_from, date_to):
+    """Check whether a partition can hold shipments within [date_from, date_to]"""
+    if key == UNDATED_PARTITION:
+        return not date_from and not date_to
+    
+    first, last = partition_bounds(key, granularity)
+    return (not date_from or last >= date_from) and (not date_to or first <= date_to)
+
+
+def parse_archive_cutoff(before):
+    """Convert an archive `before` value ('YYYY', 'YYYY-MM' or 'YYYY-MM-DD') to its first day"""
+    for fmt in ('%Y-%m-%d', '%Y-%m', '%Y'):
+        try:
+            return datetime.strptime(str(before), fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    raise ValueError('before must be YYYY, YYYY-MM or YYYY-MM-DD')
+
+
+def record_in_date_range(record, date_from, date_to):
+    """Check whether a record's date of shipment falls within [date_from, date_to]"""
+    shipped = str(record.get('dateOfShipment') or '')[:10]
+    if not shipped:
+        return False
+    return (not date_from or shipped >= date_from) and (not date_to or shipped <= date_to)
+
+
+def parse_date_filter(value):
+    """Validate an optional 'YYYY-MM-DD' filter value"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+
+
+def set_partition_segments(partition, segments):
+    """Point a hot partition at a new list of segment files and update its totals"""
+    partition['segments'] = segments
+    partition['count'] = sum(segment['count'] for segment in segments)
+    partition['maxId'] = max((segment['maxId'] for segment in segments), default=0)
+
+
+def partition_sources(partition):
+    """Return the (path, sheet) pairs a partition's rows are stored in, in row order"""
+    if partition.get('archived'):
+        return [(os.path.join(PARTITION_DIR, partition['archive']), partition['key'])]
+    return [(os.path.join(PARTITION_DIR, segment['file']), None) for segment in partition['segments']]
+
+
+def new_partition_file(prefix):
+    """Return a file name that has never been used in the partition store"""
+    return f'{prefix}_{uuid.uuid4().hex[:12]}.xlsx'
+
+
+def retire_file(manifest, file_name):
+    """Schedule a file the manifest stops referencing for removal after the grace period"""
+    manifest.setdefault('retired', []).append({'file': file_name, 'retiredAt': time.time()})
+
+
+def remove_retired_files(manifest):
+    """Delete retired files whose grace period is over; caller holds store_transaction()"""
+    cutoff = time.time() - RETIRED_FILE_GRACE
+    retired = []
+    for entry in manifest.get('retired', []):
+        if entry['retiredAt'] > cutoff:
+            retired.append(entry)
+            continue
+        try:
+            os.remove(os.path.join(PARTITION_DIR, entry['file']))
+        except FileNotFoundError:
+            pass
+        remove_snapshots(entry['file'])
+    manifest['retired'] = retired
+
+
+def find_partition(manifest, key):
+    """Return the manifest entry for a partition key, or None"""
+    for partition in manifest['partitions']:
+        if partition['key'] == key:
+            return partition
+    return None
+
+
+def iter_partitions(manifest):
+    """Yield (partition, offset) where offset is the number of records in earlier partitions"""
+    offset = 0
+    for partition in manifest['partitions']:
+        yield partition, offset
+        offset += partition['count']
+
+
+def partition_data(manifest, key):
+    """Return the records of partition `key` as numbered in the manifest (empty if it is new)"""
+    for partition, offset in iter_partitions(manifest):
+        if partition['key'] == key:
+            return read_partition_data(partition, offset)
+    return []
+
+
+def find_record_partition(manifest, record_id, original_id=None):
+    """Return (partition key, records) for the partition holding a record, or (None, [])
+
+    IDs are positions, which shift when an entry with an earlier date of
+    shipment is added; the original ID, when given, never does.
+    """
+    for partition, offset in iter_partitions(manifest):
+        if original_id not in (None, ''):
+            found = any(str(original_id) in entry['index']['original_ids']
+                        for entry in load_partition_entries(partition))
+        else:
+            found = offset < record_id <= offset + partition['count']
+        if found:
+            return partition['key'], read_partition_data(partition, offset)
+    return None, []
+
+
+def read_manifest():
+    """Return a fresh copy of the partition manifest as currently on disk"""
+    with open(MANIFEST_FILE, 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(manifest):
+    """Atomically replace the manifest, committing the write; caller holds store_transaction()"""
+    remove_retired_files(manifest)
+    manifest['partitions'].sort(key=lambda partition: partition['key'])
+    tmp_path = f'{MANIFEST_FILE}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+    _manifest_cache.pop('current', None)
+
+
+def hot_partition(manifest, key):
+    """Return the manifest entry for a writable partition, adding it if it is new"""
+    partition = find_partition(manifest, key)
+    if partition is None:
+        partition = {'key': key, 'segments': [], 'count': 0, 'maxId': 0, 'archived': False}
+        manifest['partitions'].append(partition)
+    if partition['archived']:
+        raise ArchivedPartitionError(f"Shipments for {key} are archived and read-only")
+    return partition
+
+
+def stored_record(record):
+    """Return a record as write_segment() stores it and parse_workbook_records() reads it back"""
+    return {field: normalize_cell_value(record.get(field, '')) for field in ALL_FIELDS}
+
+
+def stored_values(records):
+    """Return stored records' values without their positional IDs, for comparing rows"""
+    fields = ALL_FIELDS[1:]
+    return [tuple(map(record.get, fields)) for record in records]
+
+
+def write_segment(key, records):
+    """Save records as a new partition file and return its segment entry"""
+    wb = create_tracker_workbook()
+    ws = wb.active
+    records = [stored_record(record) for record in records]
+    for record in records:
+        ws.append([record[field] for field in ALL_FIELDS])
+    
+    # Always a new name; readers keep using the old files until the manifest is replaced
+    file_name = new_partition_file(f'tracker_{key}')
+    path = os.path.join(PARTITION_DIR, file_name)
+    wb.save(path)
+    wb.close()
+    
+    entry = cache_records(path, None, records)
+    return {'file': file_name, 'count': len(records), 'maxId': entry['index']['max_id']}
+
+
+def write_partition(manifest, key, data):
+    """Rewrite one hot partition with the given records; caller holds store_transaction()
+
+    Only the segment files whose rows changed are rewritten; leading and
+    trailing segments that still hold the same rows are kept as they are.
+    """
+    partition = hot_partition(manifest, key)
+    segments = partition['segments']
+    # Rows are compared as given; a value that only differs in how it is
+    # stored (e.g. '' for None) just means one more segment is rewritten
+    records = data
+    
+    start = 0
+    head = []
+    for segment in segments:
+        stored = load_file_records(os.path.join(PARTITION_DIR, segment['file']))['records']
+        if stored_values(stored) != stored_values(records[start:start + len(stored)]):
+            break
+        head.append(segment)
+        start += len(stored)
+    
+    end = len(records)
+    tail = []
+    for segment in reversed(segments[len(head):]):
+        stored = load_file_records(os.path.join(PARTITION_DIR, segment['file']))['records']
+        if len(stored) > end - start or stored_values(stored) != stored_values(records[end - len(stored):end]):
+            break
+        tail.insert(0, segment)
+        end -= len(stored)
+    
+    # Fold short neighbouring segments into the rewrite instead of leaving many small files
+    if start < end:
+        if head and head[-1]['count'] < SEGMENT_ROWS:
+            start -= head.pop()['count']
+        if tail and tail[0]['count'] < SEGMENT_ROWS:
+            end += tail.pop(0)['count']
+    
+    written = [write_segment(key, records[i:min(i + SEGMENT_ROWS, end)]) for i in range(start, end, SEGMENT_ROWS)]
+    kept = {segment['file'] for segment in head + tail}
+    for segment in segments:
+        if segment['file'] not in kept:
+            retire_file(manifest, segment['file'])
+    set_partition_segments(partition, head + written + tail)
+
+
+def initialize_partitions():
+    """Create the partition store, splitting the legacy master file into it on first run"""
+    global _partitions_initialized
+    if _partitions_initialized and os.path.exists(MANIFEST_FILE):
+        return
+    
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    if not os.path.exists(MANIFEST_FILE):
+        with store_transaction():
+            # Another worker may have finished the migration while we waited
+            if not os.path.exists(MANIFEST_FILE):
+                manifest = {'granularity': PARTITION_GRANULARITY, 'partitions': []}
+                if os.path.exists(MASTER_FILE):
+                    records = parse_workbook_records(MASTER_FILE)
+                    assign_unique_original_ids(records)
+                    groups = {}
+                    for record in records:
+                        key = partition_key(record.get('dateOfShipment'), PARTITION_GRANULARITY)
+                        groups.setdefault(key, []).append(record)
+                    for key in sorted(groups):
+                        write_partition(manifest, key, groups[key])
+                write_manifest(manifest)
+    _partitions_initialized = True
+
+
+def assign_unique_original_ids(records):
+    """Give every legacy entry its own original ID as it is moved into the store.
+
+    Entries saved before original IDs were kept on update can lack one or
+    share one with another entry. The first entry keeps a shared ID; the
+    others get new IDs, so the change history never mixes two entries.
+    """
+    next_id = build_record_index(records)['max_id'] + 1
+    seen = set()
+    for record in records:
+        key = history_key(record)
+        if key is None or key in seen:
+            record['originalId'] = next_id
+            key = str(next_id)
+            next_id += 1
+        elif not record.get('originalId'):
+            record['originalId'] = record['id']
+        seen.add(key)
+
+
+def read_partition_data(partition, offset):
+    """Read one partition's records, numbering IDs after the preceding partitions"""
+    # Copy so callers can modify records without touching the cache
+    data = [dict(record) for record in load_partition_records(partition)]
     
     # Renumber IDs sequentially while preserving original IDs
-    for idx, record in enumerate(data, start=1):
+    for idx, record in enumerate(data, start=offset + 1):
         # Store original ID if not already stored
         if not record.get('originalId'):
             record['originalId'] = record['id']
@@ -209,38 +835,790 @@ def read_all_data():
     return data
 
 
-def write_data_to_master(data):
-    """Write data to master file with file locking"""
-    initialize_master_file()
+def next_free_id(manifest):
+    """Return the lowest ID above every stored and reserved ID"""
+    return max([manifest.get('nextId', 1)] + [partition['maxId'] + 1 for partition in manifest['partitions']])
+
+
+def get_next_id():
+    """Reserve and return the next available ID"""
+    initialize_partitions()
+    # Reserved under the storage lock so two workers never hand out the same ID
+    return reserve_ids(1)
+
+
+def reserve_ids(count):
+    """Reserve `count` consecutive IDs for rows written outside the storage lock; returns the first"""
+    with store_transaction():
+        manifest = read_manifest()
+        first_id = next_free_id(manifest)
+        manifest['nextId'] = first_id + count
+        write_manifest(manifest)
+    return first_id
+
+
+def read_all_data(date_from=None, date_to=None):
+    """Read data from the partitions covering the date range, with IDs numbered across all partitions"""
+    initialize_partitions()
+    filtered = bool(date_from or date_to)
     
-    # Use thread lock and file lock
-    with file_lock:
-        # Open file for locking
-        lock_file = open(MASTER_FILE, 'r+')
-        if not acquire_file_lock(lock_file):
-            lock_file.close()
-            raise Exception("Could not acquire file lock. Please try again.")
+    def reader(manifest):
+        data = []
+        for partition, offset in iter_partitions(manifest):
+            if not partition_overlaps(partition['key'], manifest['granularity'], date_from, date_to):
+                continue
+            records = read_partition_data(partition, offset)
+            if filtered:
+                records = [record for record in records if record_in_date_range(record, date_from, date_to)]
+            data.extend(records)
+        return data
+    
+    data = read_consistent(reader)
+    save_snapshot()
+    return data
+
+
+def record_matches(record, record_id, original_id=None):
+    """Check whether a record is the one a client addressed, by original ID when it sent one"""
+    if original_id not in (None, ''):
+        return str(record.get('originalId')) == str(original_id)
+    return int(record.get('id', 0)) == record_id
+
+
+def locate_record(record_id, original_id=None):
+    """Return (partition key, records) for the partition holding a record, or (None, [])"""
+    initialize_partitions()
+    result = read_consistent(lambda manifest: find_record_partition(manifest, record_id, original_id))
+    save_snapshot()
+    return result
+
+
+def write_partitions(mutator):
+    """Apply a change to the store, loading and saving only the partitions it touches
+
+    mutator(manifest) runs under the storage lock against the latest manifest
+    and returns {partition key: records}. Partitions are read inside it, so
+    concurrent writers never overwrite each other's changes.
+    """
+    initialize_partitions()
+    with store_transaction():
+        manifest = read_manifest()
+        changes = mutator(manifest)
+        old_records = []
+        for key in changes:
+            partition = find_partition(manifest, key)
+            if partition and partition['archived']:
+                raise ArchivedPartitionError(f"Shipments for {key} are archived and read-only")
+            if partition:
+                old_records.extend(load_partition_records(partition))
         
-        try:
-            wb = openpyxl.load_workbook(MASTER_FILE)
-            ws = wb.active
-            
-            # Clear existing data (keep headers)
-            ws.delete_rows(2, ws.max_row)
+        ensure_history_baseline(manifest)
+        for key, data in changes.items():
+            write_partition(manifest, key, data)
+        write_manifest(manifest)
+        append_history(diff_records(old_records, [record for data in changes.values() for record in data]),
+                       manifest)
+    save_snapshot()
+
+
+def archive_partitions(before):
+    """Roll hot partitions whose shipments all fall before `before` into the read-only archive workbook"""
+    cutoff = parse_archive_cutoff(before)
+    initialize_partitions()
+    with store_transaction():
+        manifest = read_manifest()
+        # A partition is only archived once its last possible day is before the cutoff
+        cold = [partition for partition in manifest['partitions']
+                if not partition['archived'] and partition['key'] != UNDATED_PARTITION
+                and partition_bounds(partition['key'], manifest['granularity'])[1] < cutoff]
+        if not cold:
+            return []
+        
+        write_archive(manifest, {partition['key']: load_partition_records(partition) for partition in cold})
+        write_manifest(manifest)
+    save_snapshot()
+    return [partition['key'] for partition in cold]
+
+
+def write_archive(manifest, sheets):
+    """Save {partition key: records} as sheets of a new archive workbook; caller holds store_transaction()
+
+    Sheets of other archived partitions are carried over. Hot partitions
+    among the keys become archived and their files are retired.
+    """
+    # The archive is rewritten under a new name with the given sheets replaced or added
+    archived = [partition for partition in manifest['partitions'] if partition['archived']]
+    old_archive = partition_sources(archived[0])[0][0] if archived else None
+    if old_archive:
+        wb = openpyxl.load_workbook(old_archive)
+    else:
+        wb = openpyxl.Workbook()
+        wb.remove(wb.active)
+    
+    sheets = {key: [stored_record(record) for record in records] for key, records in sheets.items()}
+    for key, records in sheets.items():
+        if key in wb.sheetnames:
+            wb.remove(wb[key])
+        ws = wb.create_sheet(title=key)
+        write_tracker_headers(ws)
+        for record in records:
+            ws.append([record[field] for field in ALL_FIELDS])
+    
+    archive_file = new_partition_file('tracker_archive')
+    archive_path = os.path.join(PARTITION_DIR, archive_file)
+    wb.save(archive_path)
+    wb.close()
+    
+    checksum = file_checksum(archive_path)
+    for partition in archived:
+        # Carry already-parsed sheets over to the new archive file
+        entry = _sheet_cache.get(partition_sources(partition)[0])
+        partition['archive'] = archive_file
+        if entry and partition['key'] not in sheets:
+            cache_records(archive_path, partition['key'], entry['records'], checksum=checksum)
+    for key, records in sheets.items():
+        partition = find_partition(manifest, key)
+        if not partition['archived']:
+            for segment in partition['segments']:
+                retire_file(manifest, segment['file'])
+            partition.pop('segments', None)
+            partition['archived'] = True
+        partition['archive'] = archive_file
+        entry = cache_records(archive_path, key, records, checksum=checksum)
+        partition['count'] = len(records)
+        partition['maxId'] = entry['index']['max_id']
+    if old_archive:
+        retire_file(manifest, os.path.basename(old_archive))
+
+
+# ============ CHANGE HISTORY ============
+# Every committed change is appended to HISTORY_LOG as a delta holding only
+# the fields that changed. Once the log written since the last checkpoint
+# outgrows HISTORY_CHECKPOINT_RATIO times that checkpoint's size, the full
+# state is written to a new one, so a point-in-time read starts from the
+# nearest checkpoint and replays at most about that much of the log, while
+# checkpoints never take much more space than the log itself.
+
+class HistoryUnavailableError(Exception):
+    """Raised when no history covers the requested point in time"""
+
+
+def history_key(record):
+    """Return the stable key a record's history is filed under (its original ID)"""
+    key = record.get('originalId') or record.get('id')
+    return str(key) if key not in (None, '') else None
+
+
+def history_fields(record):
+    """Return the record fields tracked by the history, as they are stored"""
+    return {field: normalize_cell_value(record.get(field, ''))
+            for field in ALL_FIELDS if field not in HISTORY_IGNORED_FIELDS}
+
+
+def diff_records(old_records, new_records):
+    """Return the add/update/delete deltas that turn old_records into new_records"""
+    old = {}
+    for record in old_records:
+        key = history_key(record)
+        if key:
+            old[key] = history_fields(record)
+    
+    deltas = []
+    new_keys = set()
+    for record in new_records:
+        key = history_key(record)
+        if not key:
+            continue
+        new_keys.add(key)
+        fields = history_fields(record)
+        before = old.get(key)
+        if before is None:
+            changes = {field: value for field, value in fields.items() if value is not None}
+            deltas.append({'op': 'add', 'key': key, 'changes': changes})
+        else:
+            changes = {field: value for field, value in fields.items() if before.get(field) != value}
+            if changes:
+                deltas.append({'op': 'update', 'key': key, 'changes': changes})
+    
+    for key in old:
+        if key not in new_keys:
+            deltas.append({'op': 'delete', 'key': key})
+    return deltas
+
+
+def read_history_state():
+    """Return the history state (last sequence number and checkpoints), or None"""
+    try:
+        with open(HISTORY_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it into place"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def write_checkpoint(state, manifest, timestamp):
+    """Save the full current state as a checkpoint; caller holds store_transaction()"""
+    records = {}
+    for partition in manifest['partitions']:
+        for record in load_partition_records(partition):
+            key = history_key(record)
+            if key:
+                records[key] = history_fields(record)
+    
+    # Numbered by position, since two checkpoints can follow the same change
+    file_name = f"checkpoint_{len(state['checkpoints']) + 1:06d}.json"
+    file_path = os.path.join(HISTORY_DIR, file_name)
+    write_json_atomic(file_path, {'seq': state['lastSeq'], 'ts': timestamp, 'records': records})
+    state['checkpoints'].append({
+        'seq': state['lastSeq'],
+        'ts': timestamp,
+        'file': file_name,
+        'size': os.path.getsize(file_path),
+        # Replay for this checkpoint starts at this byte of the change log
+        'offset': os.path.getsize(HISTORY_LOG) if os.path.exists(HISTORY_LOG) else 0
+    })
+
+
+def checkpoint_due(state):
+    """Return True when the log since the last checkpoint has outgrown it"""
+    checkpoint = state['checkpoints'][-1]
+    logged = os.path.getsize(HISTORY_LOG) - checkpoint['offset']
+    return logged >= max(checkpoint['size'] * HISTORY_CHECKPOINT_RATIO, HISTORY_CHECKPOINT_MIN_BYTES)
+
+
+def ensure_history_baseline(manifest):
+    """Checkpoint the current state before the first logged change; caller holds store_transaction()"""
+    if os.path.exists(HISTORY_STATE_FILE):
+        return
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    state = {'lastSeq': 0, 'checkpoints': []}
+    write_checkpoint(state, manifest, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    write_json_atomic(HISTORY_STATE_FILE, state)
+
+
+def append_history(deltas, manifest):
+    """Append deltas to the change log, checkpointing when due; caller holds store_transaction()"""
+    if not deltas:
+        return
+    
+    state = read_history_state()
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with open(HISTORY_LOG, 'a') as f:
+        for delta in deltas:
+            state['lastSeq'] += 1
+            f.write(json.dumps({'seq': state['lastSeq'], 'ts': timestamp, **delta}) + '\n')
+    
+    if checkpoint_due(state):
+        write_checkpoint(state, manifest, timestamp)
+    write_json_atomic(HISTORY_STATE_FILE, state)
+
+
+def iter_history_log(offset=0):
+    """Yield change log entries from a byte offset, stopping at a partially written line"""
+    if not os.path.exists(HISTORY_LOG):
+        return
+    with open(HISTORY_LOG, 'r') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            yield json.loads(line)
+
+
+def parse_as_of(value):
+    """Convert an as_of query value to the history timestamp format"""
+    if len(value) == 10:
+        # A bare date means the state at the end of that day
+        value = f'{value} 23:59:59'
+    return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def read_data_as_of(as_of):
+    """Rebuild all records as of a timestamp from the nearest checkpoint plus later deltas"""
+    state = read_history_state()
+    if state is None:
+        raise HistoryUnavailableError('No change history has been recorded yet')
+    
+    checkpoints = [checkpoint for checkpoint in state['checkpoints'] if checkpoint['ts'] <= as_of]
+    if not checkpoints:
+        raise HistoryUnavailableError(f"History starts at {state['checkpoints'][0]['ts']}")
+    checkpoint = checkpoints[-1]
+    
+    with open(os.path.join(HISTORY_DIR, checkpoint['file']), 'r') as f:
+        records = json.load(f)['records']
+    
+    for entry in iter_history_log(checkpoint['offset']):
+        if entry['ts'] > as_of:
+            break
+        if entry['op'] == 'delete':
+            records.pop(entry['key'], None)
+        elif entry['op'] == 'add':
+            records[entry['key']] = entry['changes']
+        else:
+            records.setdefault(entry['key'], {}).update(entry['changes'])
+    
+    data = []
+    for idx, (key, fields) in enumerate(records.items(), start=1):
+        record = {field: None for field in ALL_FIELDS}
+        record.update(fields)
+        record['id'] = idx
+        record['originalId'] = int(key) if key.isdigit() else key
+        data.append(record)
+    return data
+
+
+def history_line_offsets(key):
+    """Return the byte offsets of one record's change log lines, indexing lines appended since the last call"""
+    if not os.path.exists(HISTORY_LOG):
+        return []
+    
+    with _history_index_lock:
+        if os.path.getsize(HISTORY_LOG) < _history_index['offset']:
+            # The store was recreated; start over
+            _history_index.update(offset=0, lines={})
+        with open(HISTORY_LOG, 'rb') as f:
+            f.seek(_history_index['offset'])
+            position = _history_index['offset']
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                _history_index['lines'].setdefault(json.loads(line)['key'], []).append(position)
+                position += len(line)
+        _history_index['offset'] = position
+        return list(_history_index['lines'].get(key, []))
+
+
+def read_record_history(key):
+    """Return every logged change for one record, oldest first"""
+    offsets = history_line_offsets(key)
+    if not offsets:
+        return []
+    
+    # Only this record's lines are read
+    history = []
+    with open(HISTORY_LOG, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            entry = json.loads(f.readline())
+            history.append({field: entry[field] for field in ('seq', 'ts', 'op', 'changes') if field in entry})
+    return history
+
+
+# ============ ADMISSION CONTROL ============
+
+class AdmissionBudget:
+    """Cap the gated requests (running or queued, all classes) a worker holds threads for"""
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = Lock()
+        self.held = 0
+        self.rejected = 0
+    
+    def take(self):
+        """Reserve a thread for a gated request; False means every spare thread is taken"""
+        with self._lock:
+            if self.held >= self.limit:
+                self.rejected += 1
+                return False
+            self.held += 1
+            return True
+    
+    def give_back(self):
+        """Return a thread once its request has finished or stopped waiting"""
+        with self._lock:
+            self.held -= 1
+    
+    def stats(self):
+        """Return budget counters for /metrics/admission"""
+        with self._lock:
+            return {'limit': self.limit, 'held': self.held, 'rejected': self.rejected}
+
+
+class AdmissionGate:
+    """Limit concurrent requests for a class of routes, with a bounded wait queue"""
+    
+    def __init__(self, name, concurrency, queue_size, queue_timeout, budget):
+        self.name = name
+        self.budget = budget
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._slots = BoundedSemaphore(concurrency)
+        self._lock = Lock()
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_service_time = 0.0
+    
+    def acquire(self):
+        """Take a slot, waiting in the queue if there is room; False means reject"""
+        if not self.budget.take():
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            if self._slots.acquire(blocking=False):
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                self.budget.give_back()
+                return False
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+        
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.active += 1
+                self.admitted += 1
+            else:
+                self.timed_out += 1
+        if not acquired:
+            self.budget.give_back()
+        return acquired
+    
+    def release(self, service_time):
+        """Free a slot and fold the request's duration into the service time average"""
+        with self._lock:
+            self.active -= 1
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+        self._slots.release()
+        self.budget.give_back()
+    
+    def retry_after(self):
+        """Estimate the seconds until a queued request would get a slot"""
+        with self._lock:
+            backlog = (self.waiting + self.active) / self.concurrency
+            return max(1, math.ceil(backlog * self.avg_service_time))
+    
+    def stats(self):
+        """Return queue and rejection counters for /metrics/admission"""
+        with self._lock:
+            return {
+                'concurrency': self.concurrency,
+                'queueSize': self.queue_size,
+                'queueTimeout': self.queue_timeout,
+                'active': self.active,
+                'waiting': self.waiting,
+                'peakWaiting': self.peak_waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timedOut': self.timed_out,
+                'avgServiceSeconds': round(self.avg_service_time, 3)
+            }
+
+
+def create_admission_gate(name, concurrency, queue_timeout, queue_size=None):
+    """Create a gate, letting ADMISSION_<NAME>_CONCURRENCY/_QUEUE/_TIMEOUT override the defaults"""
+    prefix = f'ADMISSION_{name.upper()}'
+    # Running and queued requests both come out of the shared budget, so a
+    # longer queue could never fill; by default the queue takes what is left
+    concurrency = min(ADMISSION_BUDGET.limit, max(1, int(os.environ.get(f'{prefix}_CONCURRENCY', concurrency))))
+    room = ADMISSION_BUDGET.limit - concurrency
+    queue_size = os.environ.get(f'{prefix}_QUEUE', room if queue_size is None else queue_size)
+    return AdmissionGate(
+        name,
+        concurrency,
+        min(room, max(0, int(queue_size))),
+        float(os.environ.get(f'{prefix}_TIMEOUT', queue_timeout)),
+        ADMISSION_BUDGET
+    )
+
+
+# Gated requests hold a thread while they run or wait, so together they may
+# use all but one of the worker's threads (GUNICORN_THREADS in gunicorn.conf.py),
+# which stays free for reads
+ADMISSION_BUDGET = AdmissionBudget(max(1, int(os.environ.get(
+    'ADMISSION_MAX_GATED', int(os.environ.get('GUNICORN_THREADS', '4')) - 1))))
+
+# Limits are per worker process; reads are never gated
+ADMISSION_GATES = {
+    'tracker_write': create_admission_gate('tracker_write', 1, 10),
+    'users_write': create_admission_gate('users_write', 1, 10),
+    'import': create_admission_gate('import', 1, 0, queue_size=0),
+    'report': create_admission_gate('report', 2, 30)
+}
+
+
+def busy_response(retry_after, message='Server is busy. Please try again shortly.'):
+    """Build a 503 response asking the client to retry later"""
+    response = jsonify({'error': 'BUSY', 'message': message, 'retryAfter': retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def admission_controlled(route_class):
+    """Decorator that admits a request only when its route class has capacity"""
+    gate = ADMISSION_GATES[route_class]
+    
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not gate.acquire():
+                return busy_response(gate.retry_after())
+            started = time.monotonic()
             
-            # Write data
-            for record in data:
-                row_data = []
-                for field in ALL_FIELDS:
-                    value = record.get(field, '')
-                    row_data.append(value)
-                ws.append(row_data)
+            def release():
+                gate.release(time.monotonic() - started)
             
-            wb.save(MASTER_FILE)
-            wb.close()
+            try:
+                response = view(*args, **kwargs)
+            except Exception:
+                release()
+                raise
+            if isinstance(response, Response) and response.is_streamed and not response.direct_passthrough:
+                # The body is generated after the view returns; hold the slot until
+                # it is finished or the client goes away
+                response.call_on_close(release)
+            else:
+                release()
+            return response
+        return wrapper
+    return decorator
+
+
+# ============ REPORT RENDERING ============
+
+def get_render_pool():
+    """Return this worker's process pool for rendering, creating it on first use"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # Not forked from this worker: its other threads may hold locks a
+            # forked child would wait on forever. The fork server is a fresh,
+            # single-threaded process that only imports rendering.py.
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['rendering'])
+            _render_pool = ProcessPoolExecutor(max_workers=RENDER_PROCESSES_PER_WORKER, mp_context=context)
+        return _render_pool
+
+
+def render_delivery_groups(records, group_by, timestamp):
+    """Render one delivery workbook per group in parallel; yields (file name, bytes) in completion order"""
+    groups = {}
+    for record in records:
+        groups.setdefault(str(record.get(group_by) or 'Unassigned'), []).append(record)
+    
+    # Keep at most one group per render process in flight, so a large request
+    # cannot fill the pool's queue ahead of other requests
+    pool = get_render_pool()
+    pending = iter(groups.items())
+    in_flight = set()
+    used_names = set()
+    try:
+        while True:
+            for name, group in pending:
+                in_flight.add(pool.submit(rendering.render_group, name, group))
+                if len(in_flight) >= RENDER_PROCESSES_PER_WORKER:
+                    break
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                group_name, data = future.result()
+                yield rendering.group_file_name(group_name, timestamp, used_names), data
+    finally:
+        # Stop rendering for a client that went away
+        for future in in_flight:
+            future.cancel()
+
+
+# ============ BULK IMPORT ============
+
+# Accept both display labels and field keys as import headers, case-insensitively.
+# ID columns are ignored; imported entries are given new IDs.
+IMPORT_HEADER_MAP = {}
+for _field, _label in FIELD_LABELS.items():
+    if _field not in ('id', 'originalId'):
+        IMPORT_HEADER_MAP[_label.lower()] = _field
+        IMPORT_HEADER_MAP[_field.lower()] = _field
+
+
+def iter_upload_rows(upload):
+    """Stream rows from an uploaded .xlsx or .csv file without loading it all into memory"""
+    filename = (upload.filename or '').lower()
+    if filename.endswith(('.xlsx', '.xlsm')):
+        wb = openpyxl.load_workbook(upload.stream, read_only=True, data_only=True)
+        try:
+            for row in wb.active.iter_rows(values_only=True):
+                yield row
         finally:
-            release_file_lock(lock_file)
-            lock_file.close()
+            wb.close()
+    elif filename.endswith('.csv'):
+        text = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        for row in csv.reader(text):
+            yield row
+    else:
+        raise ValueError('Only .xlsx and .csv files can be imported')
+
+
+def parse_import_date(value):
+    """Convert an imported Date of Shipment to 'YYYY-MM-DD'"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    text = str(value or '').strip()
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(text[:10], fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid Date of Shipment '{text}'")
+
+
+def validate_import_row(record):
+    """Validate and normalize one imported record in place"""
+    for field, value in record.items():
+        if isinstance(value, str):
+            record[field] = value.strip()
+    if not record.get('customer'):
+        raise ValueError('Customer is required')
+    if not record.get('dateOfShipment'):
+        raise ValueError('Date of Shipment is required')
+    record['dateOfShipment'] = parse_import_date(record['dateOfShipment'])
+
+
+def commit_import_batch(key, batch):
+    """Append a batch of validated records to one partition as new segment files.
+
+    The files are written before the storage lock is taken, so the lock is
+    only held to add them to the manifest and log the history.
+    """
+    first_id = reserve_ids(len(batch))
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for new_id, record in enumerate(batch, start=first_id):
+        record['id'] = new_id
+        record['originalId'] = new_id
+        record['lastModified'] = timestamp
+    segments = [write_segment(key, batch[i:i + SEGMENT_ROWS]) for i in range(0, len(batch), SEGMENT_ROWS)]
+    
+    try:
+        with store_transaction():
+            manifest = read_manifest()
+            partition = hot_partition(manifest, key)
+            ensure_history_baseline(manifest)
+            set_partition_segments(partition, partition['segments'] + segments)
+            write_manifest(manifest)
+            append_history(diff_records([], batch), manifest)
+    except Exception:
+        for segment in segments:
+            os.remove(os.path.join(PARTITION_DIR, segment['file']))
+        raise
+    save_snapshot()
+
+
+def import_records(upload, dry_run=False):
+    """Validate, deduplicate and import an uploaded file, returning a report"""
+    initialize_partitions()
+    
+    def reader(manifest):
+        entries = [entry for partition in manifest['partitions'] for entry in load_partition_entries(partition)]
+        return manifest, entries
+    
+    manifest, entries = read_consistent(reader)
+    save_snapshot()
+    granularity = manifest['granularity']
+    archived = {partition['key'] for partition in manifest['partitions'] if partition['archived']}
+    
+    # Hash index of every stored shipment, extended as rows are accepted
+    seen = set()
+    for entry in entries:
+        seen |= entry['index']['dedup']
+    
+    report = {
+        'dryRun': dry_run,
+        'totalRows': 0,
+        'imported': 0,
+        'duplicates': 0,
+        'invalid': 0,
+        'batches': 0,
+        'unmappedColumns': [],
+        'errors': []
+    }
+    
+    def reject(row_number, message):
+        report['invalid'] += 1
+        if len(report['errors']) < IMPORT_MAX_ERRORS:
+            report['errors'].append({'row': row_number, 'error': message})
+    
+    rows = iter_upload_rows(upload)
+    headers = next(rows, None)
+    if not headers:
+        raise ValueError('The uploaded file is empty')
+    
+    columns = []
+    for i, header in enumerate(headers):
+        field = IMPORT_HEADER_MAP.get(str(header or '').strip().lower())
+        if field:
+            columns.append((i, field))
+        elif header not in (None, ''):
+            report['unmappedColumns'].append(str(header))
+    if not any(field == 'customer' for _, field in columns):
+        raise ValueError('No Customer column found in the uploaded file')
+    
+    # Rows are buffered per partition, so each batch becomes new files of its
+    # partition instead of a rewrite of everything imported before it
+    buffers = {}
+    buffered = 0
+    
+    def commit(key):
+        nonlocal buffered
+        batch = buffers.pop(key)
+        buffered -= len(batch)
+        commit_import_batch(key, batch)
+        report['batches'] += 1
+    
+    for row_number, row in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in row):
+            continue  # Skip blank rows
+        report['totalRows'] += 1
+        
+        record = {field: (row[i] if i < len(row) else None) for i, field in columns}
+        try:
+            validate_import_row(record)
+        except ValueError as e:
+            reject(row_number, str(e))
+            continue
+        
+        partition = partition_key(record['dateOfShipment'], granularity)
+        if partition in archived:
+            reject(row_number, f"Date of Shipment {record['dateOfShipment']} is in an archived period")
+            continue
+        
+        key = dedup_key(record)
+        if key in seen:
+            report['duplicates'] += 1
+            continue
+        if key:
+            seen.add(key)
+        
+        report['imported'] += 1
+        if dry_run:
+            continue
+        buffers.setdefault(partition, []).append(record)
+        buffered += 1
+        if len(buffers[partition]) >= IMPORT_BATCH_SIZE:
+            commit(partition)
+        elif buffered >= IMPORT_BUFFER_ROWS:
+            commit(max(buffers, key=lambda key: len(buffers[key])))
+    
+    for key in list(buffers):
+        commit(key)
+    return report
 
 
 @app.route('/')
@@ -283,6 +1661,7 @@ def get_users():
 
 
 @app.route('/users/add', methods=['POST'])
+@admission_controlled('users_write')
 def add_user():
     """Add a new user"""
     try:
@@ -315,6 +1694,7 @@ def add_user():
 
 
 @app.route('/users/update/<int:user_id>', methods=['PUT'])
+@admission_controlled('users_write')
 def update_user(user_id):
     """Update an existing user"""
     try:
@@ -340,6 +1720,7 @@ def update_user(user_id):
 
 
 @app.route('/users/delete/<int:user_id>', methods=['DELETE'])
+@admission_controlled('users_write')
 def delete_user(user_id):
     """Delete a user"""
     try:
@@ -364,90 +1745,269 @@ def delete_user(user_id):
         return jsonify({'error': str(e)}), 500
 
 
+# ============ METRICS ROUTES ============
+
+@app.route('/metrics/admission', methods=['GET'])
+def admission_metrics():
+    """Queue depth and rejection counters for each admission-controlled route class"""
+    return jsonify({
+        'pid': os.getpid(),
+        'gated': ADMISSION_BUDGET.stats(),
+        'routes': {name: gate.stats() for name, gate in ADMISSION_GATES.items()}
+    }), 200
+
+
 # ============ TRACKER ENTRY ROUTES ============
 
 @app.route('/add', methods=['POST'])
+@admission_controlled('tracker_write')
 def add_entry():
     """Add a new entry"""
     try:
         data = request.json
-        data['id'] = get_next_id()
         data['lastModified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        position = None
         
-        all_data = read_all_data()
-        all_data.append(data)
-        write_data_to_master(all_data)
+        def add(manifest):
+            nonlocal position
+            # Reserved in the same manifest the entry is committed with
+            data['id'] = next_free_id(manifest)
+            data['originalId'] = data['id']
+            manifest['nextId'] = data['id'] + 1
+            
+            # Only the partition for this shipment date is loaded and saved
+            key = partition_key(data.get('dateOfShipment'), manifest['granularity'])
+            records = partition_data(manifest, key)
+            # The ID /data lists the entry under right after this commit
+            position = sum(partition['count'] for partition in manifest['partitions']
+                           if partition['key'] < key) + len(records) + 1
+            return {key: records + [data]}
         
-        return jsonify({'message': 'Entry added successfully', 'id': data['id']}), 201
+        write_partitions(add)
+        return jsonify({'message': 'Entry added successfully', 'id': position, 'originalId': data['originalId']}), 201
+    except ArchivedPartitionError as e:
+        return jsonify({'error': str(e)}), 409
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/update/<int:record_id>', methods=['PUT'])
+@admission_controlled('tracker_write')
 def update_entry(record_id):
     """Update an existing entry with concurrency check"""
     try:
         updated_data = request.json
         client_timestamp = updated_data.get('lastModified', '')
-        all_data = read_all_data()
-        
-        found = False
-        for i, record in enumerate(all_data):
-            if int(record.get('id', 0)) == record_id:
-                # Check if record was modified by another user
-                current_timestamp = record.get('lastModified', '')
-                if client_timestamp and current_timestamp and client_timestamp != current_timestamp:
-                    return jsonify({
-                        'error': 'CONFLICT',
-                        'message': 'This record was modified by another user. Please refresh and try again.',
-                        'current_data': record
-                    }), 409
-                
-                # Update with new timestamp
-                updated_data['id'] = record_id
-                updated_data['lastModified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                all_data[i] = updated_data
-                found = True
-                break
+        original_id = updated_data.get('originalId')
         
-        if not found:
-            return jsonify({'error': 'Record not found'}), 404
+        def update(manifest):
+            key, records = find_record_partition(manifest, record_id, original_id)
+            i = next((i for i, record in enumerate(records) if record_matches(record, record_id, original_id)), None)
+            if i is None:
+                raise RecordNotFoundError('Record not found')
+            record = records[i]
+            
+            # Check if record was modified by another user
+            current_timestamp = record.get('lastModified', '')
+            if client_timestamp and current_timestamp and client_timestamp != current_timestamp:
+                raise RecordConflictError(record)
+            
+            # Update with new timestamp, keeping the original ID the history is filed under
+            updated_data['id'] = record['id']
+            updated_data['originalId'] = record.get('originalId')
+            updated_data['lastModified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            records[i] = updated_data
+            
+            changes = {key: records}
+            new_key = partition_key(updated_data.get('dateOfShipment'), manifest['granularity'])
+            if new_key != key:
+                # The date of shipment moved the record into another partition
+                records.pop(i)
+                changes[new_key] = partition_data(manifest, new_key) + [updated_data]
+            return changes
         
-        write_data_to_master(all_data)
+        write_partitions(update)
         return jsonify({'message': 'Entry updated successfully'}), 200
+    except RecordNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except RecordConflictError as e:
+        return jsonify({'error': 'CONFLICT', 'message': str(e), 'current_data': e.record}), 409
+    except ArchivedPartitionError as e:
+        return jsonify({'error': str(e)}), 409
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/delete/<int:record_id>', methods=['DELETE'])
+@admission_controlled('tracker_write')
 def delete_entry(record_id):
-    """Delete an entry"""
+    """Delete an entry, with the same concurrency check as updates when lastModified is sent"""
     try:
-        all_data = read_all_data()
-        original_length = len(all_data)
-        
-        all_data = [record for record in all_data if int(record.get('id', 0)) != record_id]
+        original_id = request.args.get('originalId')
+        client_timestamp = request.args.get('lastModified', '')
         
-        if len(all_data) == original_length:
-            return jsonify({'error': 'Record not found'}), 404
+        def delete(manifest):
+            key, records = find_record_partition(manifest, record_id, original_id)
+            record = next((record for record in records if record_matches(record, record_id, original_id)), None)
+            if record is None:
+                raise RecordNotFoundError('Record not found')
+            
+            # Check if record was modified by another user
+            current_timestamp = record.get('lastModified', '')
+            if client_timestamp and current_timestamp and client_timestamp != current_timestamp:
+                raise RecordConflictError(record)
+            
+            return {key: [other for other in records if other is not record]}
         
-        write_data_to_master(all_data)
+        write_partitions(delete)
         return jsonify({'message': 'Entry deleted successfully'}), 200
+    except RecordNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except RecordConflictError as e:
+        return jsonify({'error': 'CONFLICT', 'message': str(e), 'current_data': e.record}), 409
+    except ArchivedPartitionError as e:
+        return jsonify({'error': str(e)}), 409
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/data', methods=['GET'])
 def get_data():
-    """Get all data"""
+    """Get all data, optionally limited to a dateFrom/dateTo range of shipment dates.
+    
+    With as_of=<timestamp>, returns the data as it was at that time.
+    """
     try:
-        data = read_all_data()
+        try:
+            date_from = parse_date_filter(request.args.get('dateFrom'))
+            date_to = parse_date_filter(request.args.get('dateTo'))
+        except ValueError:
+            return jsonify({'error': 'dateFrom and dateTo must be YYYY-MM-DD'}), 400
+        
+        as_of = request.args.get('as_of')
+        if as_of:
+            try:
+                as_of = parse_as_of(as_of)
+            except ValueError:
+                return jsonify({'error': 'as_of must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS'}), 400
+            try:
+                data = read_data_as_of(as_of)
+            except HistoryUnavailableError as e:
+                return jsonify({'error': str(e)}), 404
+            if date_from or date_to:
+                data = [record for record in data if record_in_date_range(record, date_from, date_to)]
+            return jsonify(data), 200
+        
+        data = read_all_data(date_from, date_to)
         return jsonify(data), 200
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/records/<int:record_id>/history', methods=['GET'])
+def get_record_history(record_id):
+    """Get the logged changes for an entry (by ID, or by ?originalId=), oldest first.
+    
+    With originalId the history is found even after the entry was deleted.
+    """
+    try:
+        original_id = request.args.get('originalId')
+        if original_id not in (None, ''):
+            history = read_record_history(str(original_id))
+            if history:
+                return jsonify({
+                    'id': record_id,
+                    'originalId': int(original_id) if original_id.isdigit() else original_id,
+                    'history': history
+                }), 200
+        
+        _, partition_data = locate_record(record_id, original_id)
+        record = next((record for record in partition_data if record_matches(record, record_id, original_id)), None)
+        if record is None:
+            return jsonify({'error': 'Record not found'}), 404
+        
+        key = history_key(record)
+        return jsonify({
+            'id': record_id,
+            'originalId': record.get('originalId'),
+            'history': read_record_history(key)
+        }), 200
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ============ PARTITION ROUTES ============
+
+@app.route('/partitions', methods=['GET'])
+def get_partitions():
+    """List the tracker partitions from the manifest"""
+    try:
+        initialize_partitions()
+        return jsonify(current_manifest()), 200
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/partitions/archive', methods=['POST'])
+@admission_controlled('tracker_write')
+def archive_old_partitions():
+    """Move partitions whose shipments all fall before `before` (e.g. '2024' or '2024-06') into the read-only archive"""
+    try:
+        before = (request.json or {}).get('before', '')
+        if not before:
+            return jsonify({'error': 'before is required'}), 400
+        
+        try:
+            parse_archive_cutoff(before)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        archived = archive_partitions(before)
+        return jsonify({'message': f'Archived {len(archived)} partition(s)', 'archived': archived}), 200
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ============ IMPORT ROUTES ============
+
+@app.route('/import', methods=['POST'])
+@admission_controlled('import')
+def import_entries():
+    """Bulk import entries from an uploaded .xlsx or .csv file (multipart field 'file')"""
+    try:
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        dry_run = str(request.values.get('dryRun', '')).lower() in ('1', 'true', 'yes')
+        try:
+            report = import_records(upload, dry_run=dry_run)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(report), 200
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/generate', methods=['POST'])
+@admission_controlled('report')
 def generate_excel():
     """Generate filtered Excel report with selected fields"""
     try:
@@ -457,7 +2017,14 @@ def generate_excel():
         if 'id' not in selected_fields:
             selected_fields.insert(0, 'id')
         
-        all_data = read_all_data()
+        try:
+            date_from = parse_date_filter(request.json.get('dateFrom'))
+            date_to = parse_date_filter(request.json.get('dateTo'))
+        except ValueError:
+            return jsonify({'error': 'dateFrom and dateTo must be YYYY-MM-DD'}), 400
+        
+        # Only partitions overlapping the date range are scanned
+        all_data = read_all_data(date_from, date_to)
         
         # Create new workbook
         wb = openpyxl.Workbook()
@@ -517,120 +2084,78 @@ def generate_excel():
         wb.close()
         
         return send_file(filename, as_attachment=True, download_name=filename)
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/generate-selected', methods=['POST'])
+@admission_controlled('report')
 def generate_selected_excel():
-    """Generate Excel for selected entries with header and detail sections"""
+    """Generate Excel for selected entries with header and detail sections.
+    
+    Entries are selected by `originalIds`, which stay the same when other
+    entries are added; `ids` (positions in /data) are still accepted.
+    With groupBy set to 'customer' or 'vendorName', one workbook is rendered per
+    group in parallel and the workbooks are streamed back as a ZIP archive.
+    """
     try:
+        original_ids = {str(original_id) for original_id in request.json.get('originalIds') or []}
         selected_ids = request.json.get('ids', [])
+        group_by = request.json.get('groupBy')
         
-        if not selected_ids:
+        if not original_ids and not selected_ids:
             return jsonify({'error': 'No IDs provided'}), 400
+        if group_by and group_by not in RENDER_GROUP_FIELDS:
+            return jsonify({'error': f"groupBy must be one of: {', '.join(RENDER_GROUP_FIELDS)}"}), 400
         
         all_data = read_all_data()
-        selected_data = [record for record in all_data if int(record.get('id', 0)) in selected_ids]
+        if original_ids:
+            selected_data = [record for record in all_data if str(record.get('originalId')) in original_ids]
+        else:
+            selected_data = [record for record in all_data if int(record.get('id', 0)) in selected_ids]
         
         if not selected_data:
             return jsonify({'error': 'No records found'}), 404
         
-        # Create new workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = 'Code Delivery Sheet'
-        
-        # Styling - Blue theme
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_font = Font(name='Calibri', size=12, bold=True, color='FFFFFF')
-        section_fill = PatternFill(start_color='5B9BD5', end_color='5B9BD5', fill_type='solid')
-        section_font = Font(name='Calibri', size=13, bold=True, color='FFFFFF')
-        data_font = Font(name='Calibri', size=11)
-        
-        current_row = 1
-        
-        for record in selected_data:
-            # Header fields
-            header_fields = [
-                ('vendorName', 'Vendor Name'),
-                ('customer', 'Customer'),
-                ('servicePackVersion', 'Service Pack Version'),
-                ('dateOfShipment', 'Date of Shipment'),
-                ('saveFileLibrary', 'Save File Library'),
-                ('saveFileName', 'Save File Name'),
-                ('shippedBy', 'Shipped By'),
-                ('salesforceId', 'Salesforce ID'),
-                ('jiraId', 'Jira ID'),
-                ('fileTransferLink', 'File Transfer Link'),
-                ('issueDescription', 'Issue Description')
-            ]
-            
-            for field_key, field_label in header_fields:
-                ws.cell(row=current_row, column=1, value=field_label).font = Font(name='Calibri', size=11, bold=True)
-                ws.cell(row=current_row, column=2, value=record.get(field_key, '')).font = data_font
-                current_row += 1
-            
-            current_row += 1
-            
-            # Detail headers
-            detail_headers = ['Object Name', 'Object Type', 'Object Description', 'Action Type', 'Destination Type', 'Downtime', 'Special Instructions']
-            for col, header in enumerate(detail_headers, start=1):
-                cell = ws.cell(row=current_row, column=col, value=header)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            current_row += 1
-            
-            # Parse detail lines (split by pipe)
-            object_names = (record.get('objectName', '') or '').split(' | ')
-            object_types = (record.get('objectType', '') or '').split(' | ')
-            object_descs = (record.get('objectDescriptionWithVersion', '') or '').split(' | ')
-            action_types = (record.get('actionType', '') or '').split(' | ')
-            dest_types = (record.get('destinationObjectLibraryType', '') or '').split(' | ')
-            downtimes = (record.get('downtimeRequired', '') or '').split(' | ')
-            instructions = (record.get('specialInstructions', '') or '').split(' | ')
-            
-            max_details = max(len(object_names), len(object_types), len(object_descs), 
-                            len(action_types), len(dest_types), len(downtimes), len(instructions))
-            
-            for i in range(max_details):
-                ws.cell(row=current_row, column=1, value=object_names[i] if i < len(object_names) else '').font = data_font
-                ws.cell(row=current_row, column=2, value=object_types[i] if i < len(object_types) else '').font = data_font
-                ws.cell(row=current_row, column=3, value=object_descs[i] if i < len(object_descs) else '').font = data_font
-                ws.cell(row=current_row, column=4, value=action_types[i] if i < len(action_types) else '').font = data_font
-                ws.cell(row=current_row, column=5, value=dest_types[i] if i < len(dest_types) else '').font = data_font
-                ws.cell(row=current_row, column=6, value=downtimes[i] if i < len(downtimes) else '').font = data_font
-                ws.cell(row=current_row, column=7, value=instructions[i] if i < len(instructions) else '').font = data_font
-                
-                for col in range(1, 8):
-                    ws.cell(row=current_row, column=col).alignment = Alignment(vertical='center', wrap_text=True)
-                
-                current_row += 1
-            
-            current_row += 2  # Space between entries
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if group_by:
+            entries = render_delivery_groups(selected_data, group_by, timestamp)
+            response = Response(
+                rendering.stream_zip(entries),
+                mimetype='application/zip',
+                headers={'Content-Disposition': f'attachment; filename=tracker_entries_{timestamp}.zip'}
+            )
+            response.call_on_close(entries.close)
+            return response
         
-        # Set column widths
-        ws.column_dimensions['A'].width = 25
-        ws.column_dimensions['B'].width = 30
-        ws.column_dimensions['C'].width = 35
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 20
-        ws.column_dimensions['F'].width = 15
-        ws.column_dimensions['G'].width = 40
+        # Create new workbook
+        wb = rendering.create_delivery_workbook(selected_data)
         
         # Save the file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'tracker_entries_{timestamp}.xlsx'
         wb.save(filename)
         wb.close()
         
         return send_file(filename, as_attachment=True, download_name=filename)
+    except StorageBusyError as e:
+        return busy_response(1, str(e))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Parse once at import so `gunicorn --preload` shares the data with all workers.
+# Skipped when a render process re-imports this file as its main module
+# (`python app.py`); renderers only need rendering.py.
+if __name__ != '__mp_main__':
+    try:
+        warm_cache()
+    except Exception as e:
+        print(f"Warning: could not warm data cache: {e}")
+
+
 if __name__ == '__main__':
-    initialize_master_file()
+    initialize_partitions()
     initialize_users_file()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,235 @@
+"""
+ASGI serving mode for the tracker.
+
+Serves every route in app.py over ASGI, e.g.:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+Waiting on the network (slow uploads, slow downloads, idle keep-alive
+connections) happens on the event loop and costs a coroutine. Only the Flask
+view itself, with its openpyxl parsing and saving, runs on a bounded thread
+pool. Requests beyond the pool plus the pending queue are answered with 503
+straight away instead of tying up a worker. Streamed responses, such as the
+grouped /generate-selected ZIP, are sent chunk by chunk as the view produces
+them; each chunk is produced on the pool.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+
+# Threads that run Flask views (openpyxl work)
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '8'))
+
+# Requests allowed to wait for a free thread before new ones get 503
+MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', '64'))
+
+# Request bodies above this size are spooled to a temp file
+BODY_SPOOL_SIZE = 1024 * 1024
+
+# Chunk size used when streaming files back to the client
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+_slots = None
+
+
+class AsgiFileWrapper:
+    """wsgi.file_wrapper that hands send_file() files back to the event loop"""
+
+    def __init__(self, file, buffer_size=RESPONSE_CHUNK_SIZE):
+        self.file = file
+        self.buffer_size = buffer_size
+
+    def __iter__(self):
+        # Only used if something iterates the body inside the worker thread
+        while True:
+            chunk = self.file.read(self.buffer_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope into a WSGI environ"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': AsgiFileWrapper
+    }
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def run_wsgi(environ):
+    """Call the Flask app on a worker thread and collect its response
+
+    Returns (status, headers, body, stream): a response of known length is
+    collected into body; files and streamed responses are returned as stream
+    and sent from the event loop.
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                               for name, value in headers]
+
+    result = flask_app.wsgi_app(environ, start_response)
+    if isinstance(result, AsgiFileWrapper):
+        # Stream files from the event loop so slow clients don't hold a thread
+        return response['status'], response['headers'], None, result
+    if not any(name == b'content-length' for name, _ in response['headers']):
+        # Generated while it is sent (e.g. the /generate-selected ZIP), so don't buffer it
+        return response['status'], response['headers'], None, result
+
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body, None
+
+
+async def read_body(receive):
+    """Receive the request body without holding a thread; None if the client left"""
+    body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    body.seek(0)
+    return body
+
+
+async def send_busy(send):
+    """Reject a request because every thread and queue slot is taken"""
+    payload = b'{"error": "BUSY", "message": "Server is busy. Please try again shortly.", "retryAfter": 1}'
+    await send({
+        'type': 'http.response.start',
+        'status': 503,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(payload)).encode()),
+                    (b'retry-after', b'1')]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def stream_file(send, wrapper):
+    """Send a file body in chunks, reading each chunk on the thread pool"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, wrapper.file.read, wrapper.buffer_size)
+            if not chunk:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        wrapper.close()
+
+
+async def stream_iterable(send, result):
+    """Send a streamed response as the app produces it, producing each chunk on the thread pool"""
+    loop = asyncio.get_running_loop()
+    chunks = iter(result)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            # Runs the app's cleanup, such as giving back its admission slot
+            await loop.run_in_executor(executor, result.close)
+
+
+async def handle_http(scope, receive, send):
+    """Serve one HTTP request through the Flask app"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(WSGI_THREADS + MAX_PENDING)
+
+    body = await read_body(receive)
+    if body is None:
+        return
+
+    if _slots.locked():
+        body.close()
+        await send_busy(send)
+        return
+
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        try:
+            status, headers, content, stream = await loop.run_in_executor(
+                executor, run_wsgi, build_environ(scope, body))
+        finally:
+            body.close()
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    if isinstance(stream, AsgiFileWrapper):
+        await stream_file(send, stream)
+    elif stream is not None:
+        await stream_iterable(send, stream)
+    else:
+        await send({'type': 'http.response.body', 'body': content})
+
+
+async def handle_lifespan(receive, send):
+    """Acknowledge startup and shut the thread pool down with the server"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
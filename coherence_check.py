@@ -0,0 +1,219 @@
+"""
+Multi-process coherence check for the partitioned tracker store.
+
+Starts several writer and reader processes, each importing its own copy of
+app.py against a shared store in a temporary directory, the way gunicorn
+workers do. Writers repeatedly stamp a sequence number onto two canary
+entries that live in different partitions, in one transaction. Readers check
+that:
+
+  - both canaries always carry the same number (no torn reads across partitions)
+  - the number a reader sees never goes backwards (no stale reads)
+  - it is never older than the last write committed before the read began
+
+Adders meanwhile POST /add into a canary's partition. At the end every
+accepted add must be stored, and the change history must not log a delete.
+
+Usage:
+    python3 coherence_check.py
+    python3 coherence_check.py --writers 3 --readers 6 --duration 20
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CANARY_DATES = ('2024-06-01', '2025-06-01')
+ADDER_DATE = CANARY_DATES[1]
+
+
+def load_app(workdir):
+    """Import app.py inside a worker process, against the shared store"""
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    import app
+    return app
+
+
+def canary_tokens(records):
+    """Return the sequence numbers stamped on the two canaries"""
+    tokens = [int(record['specialInstructions']) for record in records
+              if record.get('customer') == 'CANARY']
+    if len(tokens) != 2:
+        raise AssertionError(f'expected 2 canaries, found {len(tokens)}')
+    return tokens
+
+
+def bump_canaries(app):
+    """Stamp the next sequence number on both canaries in one transaction"""
+    with app.store_transaction():
+        manifest = app.read_manifest()
+        changes = {}
+        for date in CANARY_DATES:
+            key = app.partition_key(date, manifest['granularity'])
+            partition = app.find_partition(manifest, key)
+            changes[key] = [dict(record) for record in app.load_partition_records(partition)]
+
+        token = canary_tokens([record for records in changes.values() for record in records])[0] + 1
+        manifest = dict(manifest, partitions=[dict(partition) for partition in manifest['partitions']])
+        for key, records in changes.items():
+            for record in records:
+                if record.get('customer') == 'CANARY':
+                    record['specialInstructions'] = str(token)
+            app.write_partition(manifest, key, records)
+        app.write_manifest(manifest)
+    return token
+
+
+def writer(workdir, committed, stop, errors, interval):
+    """Keep bumping the canaries until stopped"""
+    app = load_app(workdir)
+    try:
+        while not stop.is_set():
+            try:
+                token = bump_canaries(app)
+            except app.StorageBusyError:
+                continue
+            with committed.get_lock():
+                committed.value = max(committed.value, token)
+            stop.wait(interval)
+    except Exception as e:
+        errors.put(f'writer {os.getpid()}: {e!r}')
+
+
+def reader(workdir, committed, stop, errors, reads):
+    """Read through read_all_data() and check the canaries"""
+    app = load_app(workdir)
+    last_seen = 0
+    try:
+        while not stop.is_set():
+            floor = committed.value
+            try:
+                first, second = canary_tokens(app.read_all_data())
+            except app.StorageBusyError:
+                continue
+            if first != second:
+                raise AssertionError(f'torn read: canaries at {first} and {second}')
+            if first < last_seen:
+                raise AssertionError(f'went backwards from {last_seen} to {first}')
+            if first < floor:
+                raise AssertionError(f'stale read: saw {first} after {floor} was committed')
+            last_seen = first
+            with reads.get_lock():
+                reads.value += 1
+    except Exception as e:
+        errors.put(f'reader {os.getpid()}: {e!r}')
+
+
+def adder(workdir, added, stop, errors):
+    """Add entries through the /add route until stopped"""
+    app = load_app(workdir)
+    client = app.app.test_client()
+    try:
+        while not stop.is_set():
+            response = client.post('/add', json={'customer': 'ADDER', 'dateOfShipment': ADDER_DATE})
+            if response.status_code == 201:
+                with added.get_lock():
+                    added.value += 1
+            elif response.status_code != 503:
+                raise AssertionError(f'/add returned {response.status_code}: {response.get_data(as_text=True)}')
+    except Exception as e:
+        errors.put(f'adder {os.getpid()}: {e!r}')
+
+
+def count_added(workdir, result):
+    """Report how many entries the adders left in the store"""
+    app = load_app(workdir)
+    result.put(sum(1 for record in app.read_all_data() if record.get('customer') == 'ADDER'))
+
+
+def seed_store(workdir):
+    """Create the store with one canary in each of two partitions"""
+    app = load_app(workdir)
+    for date in CANARY_DATES:
+        def add_canary(manifest):
+            key = app.partition_key(date, manifest['granularity'])
+            canary = {'id': app.next_free_id(manifest), 'customer': 'CANARY',
+                      'dateOfShipment': date, 'specialInstructions': '0'}
+            return {key: app.partition_data(manifest, key) + [canary]}
+        app.write_partitions(add_canary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--adders', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10, help='seconds to run')
+    parser.add_argument('--write-interval', type=float, default=0.02, help='pause between a writer\'s commits')
+    args = parser.parse_args()
+
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix='tracker_coherence_')
+    for name in ('app.py', 'rendering.py'):
+        shutil.copy(os.path.join(source_dir, name), workdir)
+
+    # Fresh interpreters, like separately started workers
+    context = multiprocessing.get_context('spawn')
+    seed = context.Process(target=seed_store, args=(workdir,))
+    seed.start()
+    seed.join()
+
+    committed = context.Value('q', 0)
+    reads = context.Value('q', 0)
+    added = context.Value('q', 0)
+    stop = context.Event()
+    errors = context.Queue()
+    processes = [context.Process(target=writer, args=(workdir, committed, stop, errors, args.write_interval))
+                 for _ in range(args.writers)]
+    processes += [context.Process(target=reader, args=(workdir, committed, stop, errors, reads))
+                  for _ in range(args.readers)]
+    processes += [context.Process(target=adder, args=(workdir, added, stop, errors))
+                  for _ in range(args.adders)]
+    failures = []
+    try:
+        for process in processes:
+            process.start()
+        time.sleep(args.duration)
+        stop.set()
+        for process in processes:
+            process.join()
+
+        result = context.Queue()
+        counter = context.Process(target=count_added, args=(workdir, result))
+        counter.start()
+        stored = result.get()
+        counter.join()
+        if stored != added.value:
+            failures.append(f'lost adds: {added.value} accepted, {stored} stored')
+
+        with open(os.path.join(workdir, 'tracker_partitions', 'history', 'changes.jsonl')) as f:
+            deletes = sum(1 for line in f if json.loads(line)['op'] == 'delete')
+        if deletes:
+            failures.append(f'history logged {deletes} deletes nobody made')
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    while not errors.empty():
+        failures.append(errors.get())
+
+    print(f'{args.writers} writers, {args.readers} readers, {args.adders} adders, {args.duration:.0f}s: '
+          f'{committed.value} commits, {reads.value} consistent reads, {added.value} adds')
+    if failures:
+        print('FAILED')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+# Gunicorn settings, picked up automatically from the working directory
+import gc
+import os
+
+# Import app.py once in the master so the parsed tracker data (loaded from
+# the snapshots in tracker_partitions/snapshots/) is shared copy-on-write by every worker
+preload_app = True
+
+
+def when_ready(server):
+    """Move preloaded objects out of the GC's reach before workers fork"""
+    # Without this the first collection in each worker touches every object
+    # and copies the shared pages
+    gc.freeze()
+
+
+# Threads per worker (gthread). The admission gates in app.py let gated
+# requests (running or queued) hold at most threads - 1 of them, so at least
+# one thread is always left to serve reads.
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Worker processes. app.py divides RENDER_PROCESSES between them by reading
+# the same variable, so keep the two in step.
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
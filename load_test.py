@@ -0,0 +1,150 @@
+"""
+Load test comparing the gunicorn (WSGI) setup with the ASGI serving mode.
+
+Each server is started on a copy of the app in a temporary directory. While
+a number of slow clients hold connections open (sending their request
+headers a byte at a time, like a stalled Teams client or a long poll), a set
+of normal clients hammer GET /data. The report shows how many requests the
+normal clients got through and their latency.
+
+Usage:
+    python3 load_test.py                      # compare both modes
+    python3 load_test.py --modes asgi --slow-clients 200 --duration 20
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+APP_FILES = ['app.py', 'asgi.py', 'rendering.py', 'gunicorn.conf.py', 'index.html', 'tracker_master_data.xlsx']
+
+SERVER_COMMANDS = {
+    # Same settings as the Procfile/startup.sh deployment (gunicorn.conf.py is picked up)
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:{port}',
+                 '--workers', '{workers}', 'app:app'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+             '--port', '{port}', '--workers', '{workers}', '--log-level', 'warning']
+}
+
+
+def free_port():
+    """Return a free local TCP port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, workdir, port, workers):
+    """Start a server in workdir and wait until it answers"""
+    command = [part.format(port=port, workers=workers) for part in SERVER_COMMANDS[mode]]
+    process = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/data', timeout=2).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def slow_client(port, stop):
+    """Hold a connection open by trickling request headers until stopped"""
+    try:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    except OSError:
+        return
+    try:
+        sock.sendall(b'GET /data HTTP/1.1\r\nHost: localhost\r\n')
+        while not stop.is_set():
+            sock.sendall(b'X')
+            stop.wait(1)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def fast_client(port, stop, latencies, errors):
+    """Issue GET /data requests back to back, recording latency"""
+    url = f'http://127.0.0.1:{port}/data'
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                response.read()
+            latencies.append(time.perf_counter() - started)
+        except OSError:
+            errors.append(1)
+
+
+def run_mode(mode, args):
+    """Run the workload against one serving mode and return its results"""
+    workdir = tempfile.mkdtemp(prefix=f'tracker_{mode}_')
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in APP_FILES:
+        shutil.copy(os.path.join(source_dir, name), workdir)
+
+    port = free_port()
+    process = start_server(mode, workdir, port, args.workers)
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=slow_client, args=(port, stop)) for _ in range(args.slow_clients)]
+    threads += [threading.Thread(target=fast_client, args=(port, stop, latencies, errors))
+                for _ in range(args.clients)]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        process.terminate()
+        process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / args.duration,
+        'p50': statistics.median(latencies) if latencies else None,
+        'p95': latencies[int(len(latencies) * 0.95)] if latencies else None
+    }
+
+
+def format_seconds(value):
+    return f'{value * 1000:.1f} ms' if value is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=list(SERVER_COMMANDS), default=list(SERVER_COMMANDS))
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes')
+    parser.add_argument('--clients', type=int, default=8, help='clients issuing GET /data')
+    parser.add_argument('--slow-clients', type=int, default=50, help='connections held open by slow clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per mode')
+    args = parser.parse_args()
+
+    print(f'{args.clients} clients, {args.slow_clients} slow clients, '
+          f'{args.workers} worker(s), {args.duration:.0f}s per mode')
+    print(f"{'mode':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50':>12}{'p95':>12}")
+    for mode in args.modes:
+        result = run_mode(mode, args)
+        print(f"{result['mode']:<10}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10.1f}"
+              f"{format_seconds(result['p50']):>12}{format_seconds(result['p95']):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Code Delivery Sheet rendering for /generate-selected.
+
+Kept separate from app.py so process-pool workers only import openpyxl and
+this module, not the Flask app and its data cache. Style objects are built
+once per process and shared by every cell instead of being created per cell.
+"""
+
+import io
+import re
+import zipfile
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Alignment
+
+# Styling - Blue theme, shared by every cell
+HEADER_FILL = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+HEADER_FONT = Font(name='Calibri', size=12, bold=True, color='FFFFFF')
+LABEL_FONT = Font(name='Calibri', size=11, bold=True)
+DATA_FONT = Font(name='Calibri', size=11)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center', wrap_text=True)
+DETAIL_ALIGNMENT = Alignment(vertical='center', wrap_text=True)
+
+# Header fields shown above each entry's detail table
+HEADER_FIELDS = [
+    ('vendorName', 'Vendor Name'),
+    ('customer', 'Customer'),
+    ('servicePackVersion', 'Service Pack Version'),
+    ('dateOfShipment', 'Date of Shipment'),
+    ('saveFileLibrary', 'Save File Library'),
+    ('saveFileName', 'Save File Name'),
+    ('shippedBy', 'Shipped By'),
+    ('salesforceId', 'Salesforce ID'),
+    ('jiraId', 'Jira ID'),
+    ('fileTransferLink', 'File Transfer Link'),
+    ('issueDescription', 'Issue Description')
+]
+
+# Detail table columns; each field holds one value per object, separated by ' | '
+DETAIL_HEADERS = ['Object Name', 'Object Type', 'Object Description', 'Action Type',
+                  'Destination Type', 'Downtime', 'Special Instructions']
+DETAIL_FIELDS = ['objectName', 'objectType', 'objectDescriptionWithVersion', 'actionType',
+                 'destinationObjectLibraryType', 'downtimeRequired', 'specialInstructions']
+
+COLUMN_WIDTHS = {'A': 25, 'B': 30, 'C': 35, 'D': 15, 'E': 20, 'F': 15, 'G': 40}
+
+
+def write_delivery_sheet(ws, records):
+    """Write header and detail sections for each record into a worksheet"""
+    current_row = 1
+
+    for record in records:
+        for field_key, field_label in HEADER_FIELDS:
+            ws.cell(row=current_row, column=1, value=field_label).font = LABEL_FONT
+            ws.cell(row=current_row, column=2, value=record.get(field_key, '')).font = DATA_FONT
+            current_row += 1
+
+        current_row += 1
+
+        # Detail headers
+        for col, header in enumerate(DETAIL_HEADERS, start=1):
+            cell = ws.cell(row=current_row, column=col, value=header)
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
+        current_row += 1
+
+        # Parse detail lines (split by pipe)
+        columns = [(record.get(field, '') or '').split(' | ') for field in DETAIL_FIELDS]
+        max_details = max(len(values) for values in columns)
+
+        for i in range(max_details):
+            for col, values in enumerate(columns, start=1):
+                cell = ws.cell(row=current_row, column=col, value=values[i] if i < len(values) else '')
+                cell.font = DATA_FONT
+                cell.alignment = DETAIL_ALIGNMENT
+            current_row += 1
+
+        current_row += 2  # Space between entries
+
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+
+def create_delivery_workbook(records):
+    """Build a Code Delivery Sheet workbook for the given records"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Code Delivery Sheet'
+    write_delivery_sheet(ws, records)
+    return wb
+
+
+def render_group(group_name, records):
+    """Render one group's workbook to bytes; runs in a process-pool worker"""
+    wb = create_delivery_workbook(records)
+    output = io.BytesIO()
+    wb.save(output)
+    wb.close()
+    return group_name, output.getvalue()
+
+
+def group_file_name(group_name, timestamp, used_names):
+    """Return a unique, filesystem-safe workbook name for a group"""
+    safe_name = re.sub(r'[^A-Za-z0-9._-]+', '_', group_name).strip('_') or 'Unassigned'
+    file_name = f'{safe_name}_{timestamp}.xlsx'
+    suffix = 2
+    while file_name in used_names:
+        file_name = f'{safe_name}_{suffix}_{timestamp}.xlsx'
+        suffix += 1
+    used_names.add(file_name)
+    return file_name
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """Write-only, unseekable buffer that zipfile writes into while we drain it"""
+
+    def __init__(self):
+        super().__init__()
+        self._data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._data += data
+        return len(data)
+
+    def drain(self):
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive chunk by chunk as (file name, bytes) entries arrive"""
+    buffer = ZipStreamBuffer()
+    # Workbooks are already compressed, so store them as-is
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for file_name, data in entries:
+            archive.writestr(file_name, data)
+            yield buffer.drain()
+    yield buffer.drain()